@@ -1,24 +1,35 @@
 import eventlet
 eventlet.monkey_patch()
+from eventlet import tpool
 
 import os
 import uuid
 import json
+import hmac
+import hashlib
 import logging
-from flask import Flask, request, jsonify, send_file, send_from_directory
+from flask import Flask, request, jsonify, send_file, send_from_directory, make_response
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-
-from services.youtube import extract_audio
-from services.transcriber import transcribe_audio
-from services.sheet_music import generate_lilypond
+from flask_socketio import SocketIO, emit, join_room
+
+from config import (
+    TMP_DIR, OUTPUT_DIR, HOST, PORT, DEBUG, MESSAGE_QUEUE, JOB_STORE, EXTERNAL_WORKERS,
+    DISK_QUOTA_BYTES, ARTIFACT_MAX_AGE, JANITOR_INTERVAL, KEEP_AUDIO, FINGERPRINT_INDEX,
+    FINGERPRINT_MAX_RECORDINGS,
+    JOB_LEASE, JOB_HEARTBEAT_INTERVAL, REALTIME_SESSION_TTL, SECRET_KEY,
+)
+from services.pipeline import run_pipeline
+from services.sheet_music import generate_musicxml
+from services.job_store import create_job_store, keep_alive
+from services.message_queue import create_client_manager
+from services.fingerprint import FingerprintIndex
+from services.storage import DiskJanitor, touch_job
+from services.notes_export import (
+    NOTES_BINARY_MIMETYPE, MIN_COMPRESS_SIZE, slice_notes, encode_notes_json,
+    encode_notes_binary, compute_etag, choose_encoding, compress,
+)
 from services.realtime import RealtimeSession
 
-# Configuration
-BASE_DIR = os.path.dirname(os.path.abspath(__file__))
-TMP_DIR = os.path.join(BASE_DIR, 'tmp')
-OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
-
 # Logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
@@ -36,17 +47,86 @@ class NumpyEncoder(json.JSONEncoder):
             return obj.tolist()
         return json.JSONEncoder.default(self, obj)
 
+
+class NumpyJSON:
+    """JSON module for Socket.IO (it needs dumps/loads, not an encoder class)."""
+
+    @staticmethod
+    def dumps(obj, **kwargs):
+        return json.dumps(obj, cls=NumpyEncoder, **kwargs)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        return json.loads(s, **kwargs)
+
 import numpy as np
 # Flask app
 app = Flask(__name__)
-app.config['SECRET_KEY'] = 'partition-generator-secret'
+app.config['SECRET_KEY'] = SECRET_KEY
 CORS(app, resources={r"/api/*": {"origins": "*"}})
-socketio = SocketIO(app, cors_allowed_origins='*', async_mode='eventlet', json=NumpyEncoder)
+socketio_options = {}
+if MESSAGE_QUEUE:
+    socketio_options['client_manager'] = create_client_manager(MESSAGE_QUEUE)
+socketio = SocketIO(
+    app,
+    cors_allowed_origins='*',
+    async_mode='eventlet',
+    json=NumpyJSON,
+    **socketio_options,
+)
+
+# Workers only see jobs through a shared store, and reach clients through the broker
+if EXTERNAL_WORKERS and (not JOB_STORE or not MESSAGE_QUEUE):
+    raise SystemExit(
+        "PARTITION_EXTERNAL_WORKERS=1 needs PARTITION_JOB_STORE and PARTITION_MESSAGE_QUEUE to be set"
+    )
 
-# In-memory job store
-jobs = {}
+# Audio served by /api/audio
+AUDIO_MIMETYPES = {'.wav': 'audio/wav', '.m4a': 'audio/mp4'}
+
+# Job store (in-memory, or shared SQLite file when scaled out)
+jobs = create_job_store(JOB_STORE)
+# Socket sid → client id / real-time session, for this process's connections only
+client_ids = {}
 realtime_sessions = {}
 
+# Fingerprints of transcribed recordings, to skip inference on duplicates
+fingerprints = (FingerprintIndex(FINGERPRINT_INDEX, max_recordings=FINGERPRINT_MAX_RECORDINGS)
+                if FINGERPRINT_INDEX else None)
+
+# Artifact eviction; live jobs are pinned, the fingerprint index counts toward the quota
+janitor = DiskJanitor(
+    [TMP_DIR, OUTPUT_DIR],
+    quota=DISK_QUOTA_BYTES,
+    max_age=ARTIFACT_MAX_AGE,
+    pinned=[jobs.active_ids],
+    files=[FINGERPRINT_INDEX] if FINGERPRINT_INDEX else [],
+    grace=JOB_LEASE,
+)
+
+
+def run_janitor():
+    """Periodically sweep job artifacts, orphaned jobs and stale real-time sessions."""
+    while True:
+        try:
+            # Walking the artifact tree is blocking I/O: keep it off the event loop
+            tpool.execute(janitor.sweep)
+        except Exception as e:
+            logger.error(f"Janitor sweep failed: {str(e)}")
+        # Without external workers nobody reclaims a job whose process died: fail it
+        if not EXTERNAL_WORKERS:
+            try:
+                for job in jobs.fail_stale(JOB_LEASE, 'Traitement interrompu, veuillez relancer'):
+                    logger.warning(f"[{job['id']}] Lease expired, job marked as failed.")
+                    emit_job_update(job)
+            except Exception as e:
+                logger.error(f"Stale job check failed: {str(e)}")
+        try:
+            jobs.prune_realtime(REALTIME_SESSION_TTL)
+        except Exception as e:
+            logger.error(f"Real-time session pruning failed: {str(e)}")
+        socketio.sleep(JANITOR_INTERVAL)
+
 
 # ─── REST API ──────────────────────────────────────────────────
 
@@ -68,7 +148,7 @@ def get_instruments():
 
 @app.route('/api/health', methods=['GET'])
 def health_check():
-    return jsonify({'status': 'ok', 'jobs_count': len(jobs)})
+    return jsonify({'status': 'ok', 'jobs_count': jobs.count(), 'disk': janitor.last_report})
 
 
 @app.route('/api/transcribe', methods=['POST'])
@@ -82,7 +162,7 @@ def start_transcription():
         return jsonify({'error': 'URL YouTube requise'}), 400
 
     job_id = str(uuid.uuid4())[:8]
-    jobs[job_id] = {
+    job = {
         'id': job_id,
         'status': 'pending',
         'step': 'queued',
@@ -93,85 +173,35 @@ def start_transcription():
         'error': None,
         'pdf_path': None,
         'audio_path': None,
+        'midi_path': None,
         'note_events': None,
         'duration': 0,
     }
 
+    jobs.save(job)
+
     logger.info(f"Starting job {job_id} for URL: {youtube_url}")
 
-    # Run pipeline in background task
-    socketio.start_background_task(run_pipeline, job_id)
+    # Run pipeline in background task, unless separate workers pick it up
+    if not EXTERNAL_WORKERS:
+        socketio.start_background_task(run_pipeline_task, job_id)
 
     return jsonify({'job_id': job_id}), 202
 
 
-def run_pipeline(job_id: str):
-    """Run the full transcription pipeline for a job."""
+def emit_job_update(job: dict):
+    """Send a job's state to every client subscribed to it."""
+    socketio.emit('job_update', job, to=job['id'])
+
+
+def run_pipeline_task(job_id: str):
+    """Run the transcription pipeline for a job in this process."""
     logger.info(f"Entering run_pipeline for job {job_id}")
     socketio.sleep(1)  # Give client time to connect
-    job = jobs[job_id]
-    job_dir = os.path.join(TMP_DIR, job_id)
-
-    try:
-        # Step 1: Download audio
-        logger.info(f"[{job_id}] Downloading audio...")
-        job['status'] = 'processing'
-        job['step'] = 'downloading'
-        job['progress'] = 10
-        socketio.emit('job_update', job)
-
-        audio_result = extract_audio(job['url'], job_dir)
-        job['title'] = audio_result['title']
-        job['audio_path'] = audio_result['audio_path']
-        job['duration'] = audio_result['duration']
-        job['progress'] = 30
-        job['step'] = 'downloaded'
-        logger.info(f"[{job_id}] Downloaded: {job['title']}")
-        socketio.emit('job_update', job)
-
-        # Step 2: Transcribe to MIDI
-        logger.info(f"[{job_id}] Transcribing audio...")
-        job['step'] = 'transcribing'
-        job['progress'] = 40
-        socketio.emit('job_update', job)
-
-        transcription = transcribe_audio(
-            audio_result['audio_path'],
-            job['instrument'],
-            job_dir,
-        )
-        job['note_events'] = transcription['note_events']
-        job['progress'] = 70
-        job['step'] = 'transcribed'
-        logger.info(f"[{job_id}] Transcribed {len(job['note_events'])} notes.")
-        socketio.emit('job_update', job)
-
-        # Step 3: Generate sheet music
-        logger.info(f"[{job_id}] Generating sheet music...")
-        job['step'] = 'generating'
-        job['progress'] = 80
-        socketio.emit('job_update', job)
-
-        output_dir = os.path.join(OUTPUT_DIR, job_id)
-        sheet = generate_lilypond(
-            transcription['midi_path'],
-            job['instrument'],
-            output_dir,
-            title=job['title'],
-        )
-        job['pdf_path'] = sheet['pdf_path']
-        job['progress'] = 100
-        job['step'] = 'complete'
-        job['status'] = 'complete'
-        logger.info(f"[{job_id}] Pipeline complete.")
-        socketio.emit('job_update', job)
-
-    except Exception as e:
-        logger.error(f"[{job_id}] Error in pipeline: {str(e)}")
-        job['status'] = 'error'
-        job['step'] = 'error'
-        job['error'] = str(e)
-        socketio.emit('job_update', job)
+    with keep_alive(jobs, job_id, JOB_HEARTBEAT_INTERVAL,
+                    on_beat=lambda: touch_job(job_id, [TMP_DIR, OUTPUT_DIR])):
+        run_pipeline(job_id, jobs, emit_job_update, TMP_DIR, OUTPUT_DIR,
+                     keep_audio=KEEP_AUDIO, fingerprints=fingerprints)
 
 
 @app.route('/api/status/<job_id>', methods=['GET'])
@@ -205,6 +235,8 @@ def download_pdf(job_id):
     if not os.path.exists(job['pdf_path']):
         return jsonify({'error': 'PDF file not found'}), 404
 
+    touch_job(job_id, [TMP_DIR, OUTPUT_DIR])
+
     return send_file(
         job['pdf_path'],
         mimetype='application/pdf',
@@ -215,46 +247,221 @@ def download_pdf(job_id):
 
 @app.route('/api/audio/<job_id>', methods=['GET'])
 def stream_audio(job_id):
-    """Stream the extracted audio file."""
+    """Stream the job's audio (compressed playback copy, or the extracted WAV)."""
     job = jobs.get(job_id)
     if not job:
         return jsonify({'error': 'Job not found'}), 404
     if not job.get('audio_path') or not os.path.exists(job['audio_path']):
         return jsonify({'error': 'Audio not available'}), 404
 
+    touch_job(job_id, [TMP_DIR, OUTPUT_DIR])
+
     return send_file(
         job['audio_path'],
-        mimetype='audio/wav',
+        mimetype=AUDIO_MIMETYPES.get(os.path.splitext(job['audio_path'])[1], 'application/octet-stream'),
     )
 
 
 @app.route('/api/notes/<job_id>', methods=['GET'])
 def get_notes(job_id):
-    """Get note events for a completed job."""
+    """
+    Get note events for a completed job.
+
+    Query params `start` / `end` (seconds) restrict the response to notes
+    starting in that time window, for progressive loading. The format is
+    negotiated via `Accept` (JSON or NOTES_BINARY_MIMETYPE) or `?format=binary`,
+    compression via `Accept-Encoding`, and responses carry an ETag.
+    """
     job = jobs.get(job_id)
     if not job:
         return jsonify({'error': 'Job not found'}), 404
     if not job.get('note_events'):
         return jsonify({'error': 'Notes not available yet'}), 400
 
-    return jsonify({
-        'notes': job['note_events'],
-        'duration': job['duration'],
-        'title': job['title'],
-        'instrument': job['instrument'],
-    })
+    start = request.args.get('start', type=float)
+    end = request.args.get('end', type=float)
+    if start is not None and end is not None and end < start:
+        return jsonify({'error': 'Invalid time window'}), 400
+
+    notes = slice_notes(job['note_events'], start, end)
+    next_start = end if end is not None and end < job['duration'] else None
+
+    if request.args.get('format') == 'binary':
+        mimetype = NOTES_BINARY_MIMETYPE
+    else:
+        mimetype = request.accept_mimetypes.best_match(
+            ['application/json', NOTES_BINARY_MIMETYPE], default='application/json'
+        )
+
+    if mimetype == NOTES_BINARY_MIMETYPE:
+        body = encode_notes_binary(notes, job['duration'])
+    else:
+        body = encode_notes_json({
+            'notes': notes,
+            'duration': job['duration'],
+            'title': job['title'],
+            'instrument': job['instrument'],
+            'window': {'start': start, 'end': end},
+            'next_start': next_start,
+            'total_count': len(job['note_events']),
+        })
+
+    encoding = choose_encoding(request.accept_encodings) if len(body) >= MIN_COMPRESS_SIZE else 'identity'
+    etag = compute_etag(body)
+    if encoding != 'identity':
+        etag = f"{etag}-{encoding}"
+
+    if request.if_none_match.contains(etag):
+        response = make_response('', 304)
+    else:
+        response = make_response(compress(body, encoding))
+        response.mimetype = mimetype
+        if encoding != 'identity':
+            response.headers['Content-Encoding'] = encoding
+
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['Vary'] = 'Accept, Accept-Encoding'
+    if next_start is not None:
+        response.headers['X-Next-Start'] = str(next_start)
+    return response
+
+
+@app.route('/api/export/<job_id>/<fmt>', methods=['GET'])
+def export_score(job_id, fmt):
+    """Stream the transcription as MIDI or MusicXML."""
+    job = jobs.get(job_id)
+    if not job:
+        return jsonify({'error': 'Job not found'}), 404
+    if fmt not in ('midi', 'musicxml'):
+        return jsonify({'error': 'Unsupported export format'}), 400
+    if not job.get('midi_path') or not os.path.exists(job['midi_path']):
+        return jsonify({'error': 'MIDI not available'}), 404
+
+    touch_job(job_id, [TMP_DIR, OUTPUT_DIR])
+
+    if fmt == 'midi':
+        return send_file(
+            job['midi_path'],
+            mimetype='audio/midi',
+            as_attachment=True,
+            download_name=f"partition_{job['instrument']}_{job_id}.mid",
+        )
+
+    # MusicXML is generated on first request, then served from disk. Its path
+    # follows from the MIDI file, so the job itself is not written: the pipeline
+    # may still be saving it
+    output_dir = os.path.join(OUTPUT_DIR, job_id)
+    musicxml_path = os.path.join(
+        output_dir, os.path.splitext(os.path.basename(job['midi_path']))[0] + '.musicxml'
+    )
+    if not os.path.exists(musicxml_path):
+        try:
+            musicxml_path = generate_musicxml(
+                job['midi_path'],
+                job['instrument'],
+                output_dir,
+                title=job['title'],
+            )['musicxml_path']
+        except Exception as e:
+            logger.error(f"[{job_id}] MusicXML export failed: {str(e)}")
+            return jsonify({'error': 'MusicXML export failed'}), 500
+
+    return send_file(
+        musicxml_path,
+        mimetype='application/vnd.recordare.musicxml+xml',
+        as_attachment=True,
+        download_name=f"partition_{job['instrument']}_{job_id}.musicxml",
+    )
 
 
 # ─── WebSocket Events ─────────────────────────────────────────
 
+def restore_realtime_session():
+    """Rebuild this client's real-time session from the job store, e.g. after a reconnect."""
+    client_id = client_ids.get(request.sid)
+    saved = jobs.get_realtime(client_id) if client_id else None
+    if not saved:
+        return None
+    job = jobs.get(saved.get('job_id'))
+    if not job or not job.get('note_events'):
+        return None
+    session = RealtimeSession.from_dict(saved, job['note_events'], job['duration'])
+    realtime_sessions[request.sid] = session
+    return session
+
+
+def get_realtime_session():
+    """Return the real-time session of the current connection, if any."""
+    return realtime_sessions.get(request.sid) or restore_realtime_session()
+
+
+def save_realtime_session(session: RealtimeSession):
+    """Persist the session clock so any instance can resume it."""
+    client_id = client_ids.get(request.sid)
+    if client_id:
+        jobs.save_realtime(client_id, session.to_dict())
+
+
+def sign_client_id(client_id: str) -> str:
+    """Build the token a client presents to prove it owns a client id."""
+    signature = hmac.new(SECRET_KEY.encode(), client_id.encode(), hashlib.sha256).hexdigest()
+    return f"{client_id}.{signature}"
+
+
+def verify_client_token(token) -> str:
+    """Return the client id of a token issued by sign_client_id(), or None."""
+    if not isinstance(token, str) or '.' not in token:
+        return None
+    client_id = token.rsplit('.', 1)[0]
+    if hmac.compare_digest(sign_client_id(client_id), token):
+        return client_id
+    return None
+
+
+def reply(event: str, data: dict):
+    """
+    Emit to the client that sent the current event.
+
+    The client is connected to this process, so the message queue is
+    bypassed: realtime_sync replies alone would otherwise write to it
+    on every animation frame of every listener.
+    """
+    emit(event, data, to=request.sid, ignore_queue=True)
+
+
 @socketio.on('connect')
-def handle_connect():
+def handle_connect(auth=None):
     print('Client connected')
+    # Clients keep a signed id so their session survives reconnecting to another instance
+    client_id = verify_client_token((auth or {}).get('client_token'))
+    if not client_id:
+        client_id = uuid.uuid4().hex
+        reply('client_token', {'token': sign_client_id(client_id)})
+    client_ids[request.sid] = client_id
+    session = restore_realtime_session()
+    if session:
+        reply('realtime_state', session.to_state())
 
 
 @socketio.on('disconnect')
 def handle_disconnect():
     print('Client disconnected')
+    client_ids.pop(request.sid, None)
+    realtime_sessions.pop(request.sid, None)
+
+
+@socketio.on('job_subscribe')
+def handle_job_subscribe(data):
+    """Subscribe to a job's updates and receive its current state."""
+    job_id = data.get('job_id')
+    job = jobs.get(job_id)
+    if not job:
+        reply('error', {'message': 'Job not found'})
+        return
+
+    join_room(job_id)
+    reply('job_update', job)
 
 
 @socketio.on('realtime_start')
@@ -263,59 +470,87 @@ def handle_realtime_start(data):
     job_id = data.get('job_id')
     job = jobs.get(job_id)
     if not job or not job.get('note_events'):
-        emit('error', {'message': 'Job not found or not ready'})
+        reply('error', {'message': 'Job not found or not ready'})
         return
 
-    session = RealtimeSession(job['note_events'], job['duration'])
+    session = RealtimeSession(job['note_events'], job['duration'], job_id=job_id)
     realtime_sessions[request.sid] = session
     session.start()
-    emit('realtime_state', session.to_state())
+    save_realtime_session(session)
+    reply('realtime_state', session.to_state())
 
 
 @socketio.on('realtime_seek')
 def handle_realtime_seek(data):
     """Seek to a position in the real-time session."""
-    session = realtime_sessions.get(request.sid)
+    session = get_realtime_session()
     if session:
         session.seek(data.get('position', 0))
-        emit('realtime_state', session.to_state())
+        save_realtime_session(session)
+        reply('realtime_state', session.to_state())
 
 
 @socketio.on('realtime_pause')
 def handle_realtime_pause():
     """Pause the real-time session."""
-    session = realtime_sessions.get(request.sid)
+    session = get_realtime_session()
     if session:
         session.pause()
-        emit('realtime_state', session.to_state())
+        save_realtime_session(session)
+        reply('realtime_state', session.to_state())
 
 
 @socketio.on('realtime_resume')
 def handle_realtime_resume():
     """Resume the real-time session."""
-    session = realtime_sessions.get(request.sid)
+    session = get_realtime_session()
     if session:
         session.start()
-        emit('realtime_state', session.to_state())
+        save_realtime_session(session)
+        reply('realtime_state', session.to_state())
 
 
 @socketio.on('realtime_sync')
 def handle_realtime_sync(data):
     """Sync position from the frontend audio player."""
-    session = realtime_sessions.get(request.sid)
+    session = get_realtime_session()
     if session:
+        was_playing = session.is_playing
         position = data.get('position', 0)
         session.seek(position)
         if data.get('playing', False):
             session.start()
         else:
             session.pause()
-        emit('realtime_state', session.to_state())
+        # Syncs arrive every frame; the stored clock only goes stale when play state changes
+        if session.is_playing != was_playing:
+            save_realtime_session(session)
+        reply('realtime_state', session.to_state())
+
+
+# ─── Maintenance ──────────────────────────────────────────────
+
+_maintenance_started = False
+
+
+def start_maintenance():
+    """Start the maintenance loop once per process, whatever server imports the app."""
+    global _maintenance_started
+    if _maintenance_started:
+        return
+    _maintenance_started = True
+    socketio.start_background_task(run_janitor)
+
+
+# With the debug reloader, `python app.py` runs twice: a parent that only watches
+# files, and the child (WERKZEUG_RUN_MAIN set) that serves requests
+if not (__name__ == '__main__' and DEBUG and not os.environ.get('WERKZEUG_RUN_MAIN')):
+    start_maintenance()
 
 
 # ─── Main ─────────────────────────────────────────────────────
 
 if __name__ == '__main__':
     print("🎵 Partition Generator Backend")
-    print("   Running on http://localhost:5001")
-    socketio.run(app, host='0.0.0.0', port=5001, debug=True)
+    print(f"   Running on http://localhost:{PORT}")
+    socketio.run(app, host=HOST, port=PORT, debug=DEBUG)
@@ -0,0 +1,49 @@
+"""
+Backend configuration, shared by the web tier (app.py) and pipeline workers (worker.py).
+Every setting can be overridden with an environment variable.
+"""
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+TMP_DIR = os.path.join(BASE_DIR, 'tmp')
+OUTPUT_DIR = os.path.join(BASE_DIR, 'output')
+
+# Must be identical on every web process (signs client ids)
+SECRET_KEY = os.environ.get('PARTITION_SECRET_KEY', 'partition-generator-secret')
+
+HOST = os.environ.get('PARTITION_HOST', '0.0.0.0')
+PORT = int(os.environ.get('PARTITION_PORT', '5001'))
+DEBUG = os.environ.get('PARTITION_DEBUG', '1') == '1'
+
+# Socket.IO message queue shared by every web process and worker:
+# 'redis://localhost:6379/0', or 'sqlite:////var/lib/partition/broker.db' for
+# the single-host SQLite stand-in. None = single process, no broker.
+MESSAGE_QUEUE = os.environ.get('PARTITION_MESSAGE_QUEUE') or None
+
+# Job store: None = in-process memory, otherwise an SQLite file path
+# shared by every web process and worker.
+JOB_STORE = os.environ.get('PARTITION_JOB_STORE') or None
+
+# When set, web processes only queue jobs and worker.py runs the pipeline.
+EXTERNAL_WORKERS = os.environ.get('PARTITION_EXTERNAL_WORKERS', '0') == '1'
+WORKER_POLL_INTERVAL = float(os.environ.get('PARTITION_WORKER_POLL_INTERVAL', '1.0'))
+# A processing job whose heartbeat is older than this is considered orphaned
+JOB_LEASE = float(os.environ.get('PARTITION_JOB_LEASE', '300'))
+JOB_HEARTBEAT_INTERVAL = JOB_LEASE / 5
+# Stored real-time session clocks not updated for this long are forgotten
+REALTIME_SESSION_TTL = float(os.environ.get('PARTITION_REALTIME_SESSION_TTL', '21600'))
+
+# Disk lifecycle of job artifacts under tmp/ and output/ (0 disables a limit)
+DISK_QUOTA_BYTES = int(float(os.environ.get('PARTITION_DISK_QUOTA_MB', '5120')) * 1024 * 1024)
+ARTIFACT_MAX_AGE = float(os.environ.get('PARTITION_ARTIFACT_MAX_AGE_HOURS', '72')) * 3600
+JANITOR_INTERVAL = float(os.environ.get('PARTITION_JANITOR_INTERVAL', '300'))
+# Keep a compressed (AAC) copy of the audio after transcription, served by /api/audio
+# for the listening mode; the WAV itself is always deleted once transcribed
+KEEP_AUDIO = os.environ.get('PARTITION_KEEP_AUDIO', '1') == '1'
+
+# Audio fingerprint index used to reuse transcriptions of identical recordings
+# ('' disables deduplication)
+FINGERPRINT_INDEX = os.environ.get('PARTITION_FINGERPRINT_INDEX', os.path.join(BASE_DIR, 'fingerprints.db'))
+# Recordings kept in the index, least recently matched dropped first (0 = unlimited);
+# the index file also counts toward DISK_QUOTA_BYTES
+FINGERPRINT_MAX_RECORDINGS = int(os.environ.get('PARTITION_FINGERPRINT_MAX_RECORDINGS', '2000'))
@@ -0,0 +1,52 @@
+"""
+SQLite helpers.
+Connections and schema setup shared by the job store, the fingerprint
+index and the SQLite message queue.
+"""
+import os
+import sqlite3
+from contextlib import contextmanager
+
+
+@contextmanager
+def connect(path: str):
+    """Open an autocommit connection to an SQLite file, closed on exit."""
+    conn = sqlite3.connect(path, timeout=30, isolation_level=None)
+    try:
+        yield conn
+    finally:
+        conn.close()
+
+
+def init_db(path: str, statements: list, columns: dict = None):
+    """
+    Switch an SQLite file to WAL mode and create its schema.
+
+    WAL lets readers in other processes proceed while one process writes.
+
+    Args:
+        path: SQLite file path.
+        statements: CREATE TABLE / CREATE INDEX ... IF NOT EXISTS statements.
+        columns: {table: [(name, definition), ...]} columns added to tables
+            created by an older version.
+    """
+    with connect(path) as conn:
+        conn.execute('PRAGMA journal_mode=WAL')
+        for statement in statements:
+            conn.execute(statement)
+        for table, table_columns in (columns or {}).items():
+            existing = {row[1] for row in conn.execute(f'PRAGMA table_info({table})')}
+            for name, definition in table_columns:
+                if name not in existing:
+                    conn.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+
+def db_size(path: str) -> int:
+    """Size in bytes of an SQLite file and its WAL / shared-memory files."""
+    total = 0
+    for suffix in ('', '-wal', '-shm'):
+        try:
+            total += os.path.getsize(path + suffix)
+        except OSError:
+            pass
+    return total
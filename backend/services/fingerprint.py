@@ -0,0 +1,349 @@
+"""
+Audio fingerprint service.
+Recognizes recordings that were already transcribed (re-uploads, lyric
+videos, other links to the same audio) so their basic-pitch output can be
+reused instead of running inference again.
+"""
+import json
+import time
+
+import librosa
+import numpy as np
+
+from services.db import connect, init_db
+
+# Analysis parameters: ~93 ms chroma frames
+FINGERPRINT_SR = 11025
+FINGERPRINT_N_FFT = 4096
+FINGERPRINT_HOP = 1024
+FRAME_SECONDS = FINGERPRINT_HOP / FINGERPRINT_SR
+
+# Frames quieter than this fraction of the loudest frame carry no hash
+SILENCE_RATIO = 0.01
+
+# A match needs this many hashes agreeing on one time offset,
+# and this fraction of the query's hashes where both recordings overlap
+MIN_MATCH_COUNT = 40
+MIN_MATCH_RATIO = 0.25
+
+# The overlap is cut into segments of this length; this fraction of the
+# segments must each hold MIN_SEGMENT_VOTES agreeing hashes, so recordings
+# sharing only a passage (radio edits, remixes) are not taken as duplicates
+MATCH_SEGMENT_SECONDS = 5.0
+MIN_SEGMENT_COVERAGE = 0.9
+MIN_SEGMENT_VOTES = 3
+
+# Uncovered audio tolerated at either end of a match, in seconds
+MAX_EDGE_GAP = 2.0
+
+# Sub-hop start positions hashed for a lookup (hop / 4 ≈ 23 ms apart)
+QUERY_SHIFTS = 4
+
+# SQLite limits the number of bound parameters per statement
+_QUERY_BATCH = 500
+
+
+def _hash_frames(y: np.ndarray, sr: int):
+    """Return (hashes, frames, loud frame mask) for a signal, skipping silent frames."""
+    chroma = librosa.feature.chroma_stft(y=y, sr=sr, n_fft=FINGERPRINT_N_FFT, hop_length=FINGERPRINT_HOP)
+    rms = librosa.feature.rms(y=y, frame_length=FINGERPRINT_N_FFT, hop_length=FINGERPRINT_HOP)[0]
+    n_frames = min(chroma.shape[1], rms.shape[0])
+    if n_frames < 3:
+        return np.zeros(0, dtype=np.uint32), np.zeros(0, dtype=np.int32), np.zeros(0, dtype=bool)
+    chroma, rms = chroma[:, :n_frames], rms[:n_frames]
+
+    # Band difference (wrapping around the octave), then its change over time
+    band_diff = chroma - np.roll(chroma, -1, axis=0)
+    bits = (band_diff[:, 1:] - band_diff[:, :-1]) > 0  # 12 x (n_frames - 1)
+    codes = (bits.T.astype(np.uint32) << np.arange(12, dtype=np.uint32)).sum(axis=1, dtype=np.uint32)
+
+    hashes = (codes[:-1] << 12) | codes[1:]
+    frames = np.arange(1, len(hashes) + 1, dtype=np.int32)
+
+    loud = rms > SILENCE_RATIO * rms.max()
+    keep = loud[1:len(hashes) + 1] & loud[2:len(hashes) + 2]
+    return hashes[keep], frames[keep], loud
+
+
+def compute_fingerprint(audio_path: str, query_shifts: int = 1) -> dict:
+    """
+    Compute a chroma fingerprint of an audio file.
+
+    Each frame gets a 12-bit code: for every pitch class, whether its chroma
+    energy rose more than its neighbour's since the previous frame. Codes of
+    consecutive frames are paired into 24-bit hashes. Chroma is normalized
+    per frame, so the hashes survive re-encoding and volume changes.
+
+    Hashes only match when two uploads line up on the frame grid, so a
+    query is also hashed with its start moved by fractions of a hop.
+
+    Args:
+        audio_path: Path to the audio file.
+        query_shifts: Number of sub-hop start positions to hash (1 to index,
+            QUERY_SHIFTS to look up).
+
+    Returns:
+        dict with keys: 'variants' (list of dicts with 'shift' in seconds,
+        'hashes' uint32 array and 'frames' int32 array; the first one is
+        unshifted), 'duration', and 'loud_start' / 'loud_end' (seconds
+        bounding the non-silent audio)
+    """
+    y, sr = librosa.load(audio_path, sr=FINGERPRINT_SR, mono=True)
+    duration = len(y) / sr
+
+    variants = []
+    for k in range(query_shifts):
+        start = k * FINGERPRINT_HOP // query_shifts
+        hashes, frames, loud = _hash_frames(y[start:], sr)
+        variants.append({'shift': start / sr, 'hashes': hashes, 'frames': frames})
+        if k == 0:
+            # Span between the first and last loud frame: leading/trailing silence
+            # (intro cards, lyric videos) must not count against coverage
+            loud_frames = np.flatnonzero(loud)
+            loud_start = loud_frames[0] * FRAME_SECONDS if len(loud_frames) else 0.0
+            loud_end = (loud_frames[-1] + 1) * FRAME_SECONDS if len(loud_frames) else duration
+
+    return {
+        'variants': variants,
+        'duration': duration,
+        'loud_start': float(loud_start),
+        'loud_end': float(min(loud_end, duration)),
+    }
+
+
+class FingerprintIndex:
+    """
+    Local SQLite index of fingerprinted recordings and their basic-pitch notes.
+
+    Like SQLiteJobStore, every call opens its own connection, so the index can
+    be shared by every web process and worker on the host.
+    """
+
+    def __init__(self, path: str, max_recordings: int = 0):
+        """
+        Args:
+            path: SQLite file path.
+            max_recordings: Recordings kept, least recently matched are dropped
+                first (0 = unlimited).
+        """
+        self.path = path
+        self.max_recordings = max_recordings
+        init_db(path, [
+            'CREATE TABLE IF NOT EXISTS recordings ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, source TEXT,'
+            ' duration REAL NOT NULL, created REAL NOT NULL, raw_notes TEXT NOT NULL,'
+            ' loud_start REAL NOT NULL DEFAULT 0, loud_end REAL, last_used REAL NOT NULL DEFAULT 0)',
+            'CREATE TABLE IF NOT EXISTS hashes ('
+            ' hash INTEGER NOT NULL, recording_id INTEGER NOT NULL, frame INTEGER NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS hashes_hash ON hashes (hash)',
+            'CREATE INDEX IF NOT EXISTS hashes_recording ON hashes (recording_id)',
+        ], columns={
+            'recordings': [
+                ('loud_start', 'REAL NOT NULL DEFAULT 0'),
+                ('loud_end', 'REAL'),
+                ('last_used', 'REAL NOT NULL DEFAULT 0'),
+            ],
+        })
+
+    def add(self, fingerprint: dict, raw_notes: list, source: str = None) -> int:
+        """
+        Store a recording's fingerprint together with its basic-pitch notes.
+
+        Args:
+            fingerprint: Result of compute_fingerprint().
+            raw_notes: Notes from detect_notes(), as [start, end, pitch, velocity].
+            source: Free-form origin (e.g. the YouTube video id), for logs.
+
+        Returns:
+            The new recording id.
+        """
+        variant = fingerprint['variants'][0]
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                now = time.time()
+                cursor = conn.execute(
+                    'INSERT INTO recordings (source, duration, created, raw_notes, loud_start, loud_end, last_used)'
+                    ' VALUES (?, ?, ?, ?, ?, ?, ?)',
+                    (source, fingerprint['duration'], now, json.dumps(raw_notes),
+                     fingerprint['loud_start'], fingerprint['loud_end'], now),
+                )
+                recording_id = cursor.lastrowid
+                conn.executemany(
+                    'INSERT INTO hashes (hash, recording_id, frame) VALUES (?, ?, ?)',
+                    zip(variant['hashes'].tolist(), [recording_id] * len(variant['hashes']),
+                        variant['frames'].tolist()),
+                )
+                if self.max_recordings:
+                    self._evict(conn, self.max_recordings)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return recording_id
+
+    @staticmethod
+    def _evict(conn, keep: int):
+        """Delete all but the `keep` most recently used recordings and their hashes."""
+        evicted = [row[0] for row in conn.execute(
+            'SELECT id FROM recordings ORDER BY last_used DESC, id DESC LIMIT -1 OFFSET ?', (keep,)
+        ).fetchall()]
+        for recording_id in evicted:
+            conn.execute('DELETE FROM hashes WHERE recording_id = ?', (recording_id,))
+            conn.execute('DELETE FROM recordings WHERE id = ?', (recording_id,))
+
+    def _lookup(self, hashes: np.ndarray) -> np.ndarray:
+        """Return the stored (hash, recording_id, frame) rows for a set of hashes."""
+        rows = []
+        with connect(self.path) as conn:
+            for i in range(0, len(hashes), _QUERY_BATCH):
+                batch = hashes[i:i + _QUERY_BATCH].tolist()
+                placeholders = ','.join('?' * len(batch))
+                rows.extend(conn.execute(
+                    f'SELECT hash, recording_id, frame FROM hashes WHERE hash IN ({placeholders})',
+                    batch,
+                ).fetchall())
+        return np.array(rows, dtype=np.int64).reshape(-1, 3)
+
+    @staticmethod
+    def _vote(hits: np.ndarray, hashes: np.ndarray, frames: np.ndarray):
+        """
+        Return the best (recording_id, offset in frames, matching query frames)
+        for one query variant.
+        """
+        # Query frames per hash (a hash can repeat within the query)
+        order = np.argsort(hashes, kind='stable')
+        sorted_hashes = hashes[order]
+        sorted_frames = frames[order]
+
+        # Pair each stored hit with every query frame carrying the same hash
+        lo = np.searchsorted(sorted_hashes, hits[:, 0], side='left')
+        hi = np.searchsorted(sorted_hashes, hits[:, 0], side='right')
+        counts = hi - lo
+        if not counts.sum():
+            return None
+        hit_index = np.repeat(np.arange(len(hits)), counts)
+        query_index = np.repeat(lo - (np.cumsum(counts) - counts), counts) + np.arange(counts.sum())
+
+        recordings = hits[hit_index, 1]
+        offsets = hits[hit_index, 2] - sorted_frames[query_index]
+
+        pairs, votes = np.unique(np.stack([recordings, offsets], axis=1), axis=0, return_counts=True)
+        recording_id, offset = pairs[int(np.argmax(votes))]
+        matched = (recordings == recording_id) & (offsets == offset)
+        return int(recording_id), int(offset), np.unique(sorted_frames[query_index[matched]])
+
+    @staticmethod
+    def _is_dense(matched_times: np.ndarray, query_times: np.ndarray, start: float, end: float) -> bool:
+        """Whether matching hashes are frequent enough, and spread over [start, end]."""
+        in_overlap = (query_times >= start) & (query_times < end)
+        matched_times = matched_times[(matched_times >= start) & (matched_times < end)]
+        if len(matched_times) < MIN_MATCH_RATIO * in_overlap.sum():
+            return False
+
+        # Segments without any query hash (quiet passages) are not counted
+        n_segments = max(1, int(np.ceil((end - start) / MATCH_SEGMENT_SECONDS)))
+        edges = np.linspace(start, end, n_segments + 1)
+        query_counts, _ = np.histogram(query_times[in_overlap], bins=edges)
+        matched_counts, _ = np.histogram(matched_times, bins=edges)
+        audible = query_counts > 0
+        covered = (matched_counts >= MIN_SEGMENT_VOTES) & audible
+        return covered.sum() >= MIN_SEGMENT_COVERAGE * audible.sum()
+
+    def match(self, fingerprint: dict):
+        """
+        Find an indexed recording that contains the same audio.
+
+        For every query variant, hashes vote for (recording, stored frame -
+        query frame). The best variant's winning offset must gather enough
+        votes, the stored recording's non-silent span must cover the
+        query's (up to MAX_EDGE_GAP at either end), and agreeing hashes must
+        be dense across the whole overlap, not just one shared passage.
+
+        Args:
+            fingerprint: Result of compute_fingerprint(), ideally with
+                query_shifts=QUERY_SHIFTS.
+
+        Returns:
+            None, or dict with keys: 'recording_id', 'source', 'offset'
+            (seconds to subtract from stored times), 'raw_notes', 'score'
+        """
+        variants = [v for v in fingerprint['variants'] if len(v['hashes']) >= MIN_MATCH_COUNT]
+        if not variants:
+            return None
+
+        # One lookup for the hashes of every variant
+        hits = self._lookup(np.unique(np.concatenate([v['hashes'] for v in variants])))
+        if not len(hits):
+            return None
+
+        best = None
+        for variant in variants:
+            result = self._vote(hits, variant['hashes'], variant['frames'])
+            if not result:
+                continue
+            recording_id, offset_frames, matched = result
+            if len(matched) >= MIN_MATCH_COUNT and (best is None or len(matched) > len(best[2])):
+                best = (recording_id, offset_frames, matched, variant)
+        if best is None:
+            return None
+        recording_id, offset_frames, matched, variant = best
+        score = len(matched)
+        # Variant frame f starts at f * FRAME_SECONDS + shift in the query
+        offset = offset_frames * FRAME_SECONDS - variant['shift']
+
+        with connect(self.path) as conn:
+            row = conn.execute(
+                'SELECT source, duration, raw_notes, loud_start, loud_end FROM recordings WHERE id = ?',
+                (recording_id,),
+            ).fetchone()
+        if not row:
+            return None
+        source, stored_duration, raw_notes, stored_start, stored_end = row
+        if stored_end is None:
+            stored_end = stored_duration
+
+        # Query's loud span, on the stored recording's timeline
+        if (fingerprint['loud_start'] + offset < stored_start - MAX_EDGE_GAP
+                or fingerprint['loud_end'] + offset > stored_end + MAX_EDGE_GAP):
+            return None
+
+        # Overlap of both non-silent spans, on the query's timeline
+        overlap_start = max(fingerprint['loud_start'], stored_start - offset)
+        overlap_end = min(fingerprint['loud_end'], stored_end - offset)
+        if not self._is_dense(matched * FRAME_SECONDS + variant['shift'],
+                              variant['frames'] * FRAME_SECONDS + variant['shift'],
+                              overlap_start, overlap_end):
+            return None
+
+        with connect(self.path) as conn:
+            conn.execute('UPDATE recordings SET last_used = ? WHERE id = ?', (time.time(), recording_id))
+
+        return {
+            'recording_id': recording_id,
+            'source': source,
+            'offset': offset,
+            'raw_notes': json.loads(raw_notes),
+            'score': score,
+        }
+
+
+def shift_notes(raw_notes: list, offset: float, duration: float) -> list:
+    """
+    Move stored notes onto the query's timeline.
+
+    Args:
+        raw_notes: Notes as [start, end, pitch, velocity].
+        offset: Seconds to subtract from stored times.
+        duration: Query duration; notes outside [0, duration] are dropped or clipped.
+
+    Returns:
+        The shifted notes.
+    """
+    shifted = []
+    for start, end, pitch, velocity in raw_notes:
+        start, end = start - offset, end - offset
+        if end <= 0 or start >= duration:
+            continue
+        shifted.append([max(start, 0.0), min(end, duration), pitch, velocity])
+    return shifted
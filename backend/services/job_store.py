@@ -0,0 +1,259 @@
+"""
+Job and real-time session storage.
+An in-memory store for single-process runs, and an SQLite-backed store
+shared by several web processes and pipeline workers.
+"""
+import json
+import time
+from contextlib import contextmanager
+
+from eventlet.patcher import original
+
+from services.db import connect, init_db
+
+# Real OS threads: heartbeats must keep beating while inference blocks the event loop
+_threading = original('threading')
+
+
+class MemoryJobStore:
+    """Keeps jobs and real-time sessions in this process's memory."""
+
+    def __init__(self):
+        self._jobs = {}
+        self._realtime = {}
+        self._heartbeats = {}
+
+    def get(self, job_id: str):
+        """Return the job dict, or None if unknown."""
+        return self._jobs.get(job_id)
+
+    def save(self, job: dict):
+        """Insert or update a job."""
+        self._jobs[job['id']] = job
+
+    def count(self) -> int:
+        """Number of known jobs."""
+        return len(self._jobs)
+
+    def active_ids(self) -> set:
+        """Ids of jobs still pending or processing."""
+        # Copy first: the janitor calls this from a real thread
+        return {job_id for job_id, job in list(self._jobs.items())
+                if job['status'] in ('pending', 'processing')}
+
+    def heartbeat(self, job_id: str):
+        """Renew the lease of a job being processed."""
+        self._heartbeats[job_id] = time.time()
+
+    def _is_stale(self, job: dict, lease: float) -> bool:
+        return (job['status'] == 'processing'
+                and time.time() - self._heartbeats.get(job['id'], 0) > lease)
+
+    def claim_pending(self, lease: float):
+        """
+        Mark the oldest pending job, or a processing job whose lease expired,
+        as processing and return it (None if none).
+        """
+        for job in self._jobs.values():
+            if job['status'] == 'pending' or self._is_stale(job, lease):
+                job['status'] = 'processing'
+                self.heartbeat(job['id'])
+                return job
+        return None
+
+    def fail_stale(self, lease: float, error: str) -> list:
+        """Mark processing jobs whose lease expired as failed, and return them."""
+        failed = []
+        for job in self._jobs.values():
+            if self._is_stale(job, lease):
+                job.update(status='error', step='error', error=error)
+                failed.append(job)
+        return failed
+
+    def get_realtime(self, client_id: str):
+        """Return the stored real-time session state for a client, or None."""
+        entry = self._realtime.get(client_id)
+        return entry[1] if entry else None
+
+    def save_realtime(self, client_id: str, state: dict):
+        """Store the real-time session state for a client."""
+        self._realtime[client_id] = (time.time(), state)
+
+    def prune_realtime(self, max_age: float) -> int:
+        """Forget real-time sessions not updated for `max_age` seconds; return how many."""
+        cutoff = time.time() - max_age
+        expired = [client_id for client_id, (updated, _) in self._realtime.items() if updated < cutoff]
+        for client_id in expired:
+            del self._realtime[client_id]
+        return len(expired)
+
+
+class SQLiteJobStore:
+    """
+    Stores jobs and real-time sessions in an SQLite file.
+
+    Every call opens its own short-lived connection, so the store can be
+    shared by any number of processes on the same host.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        init_db(path, [
+            'CREATE TABLE IF NOT EXISTS jobs ('
+            ' id TEXT PRIMARY KEY, status TEXT NOT NULL,'
+            ' created REAL NOT NULL, data TEXT NOT NULL)',
+            'CREATE INDEX IF NOT EXISTS jobs_status ON jobs (status, created)',
+            'CREATE TABLE IF NOT EXISTS realtime ('
+            ' client_id TEXT PRIMARY KEY, data TEXT NOT NULL)',
+        ], columns={
+            'jobs': [('heartbeat', 'REAL NOT NULL DEFAULT 0')],
+            'realtime': [('updated', 'REAL NOT NULL DEFAULT 0')],
+        })
+
+    def get(self, job_id: str):
+        """Return the job dict, or None if unknown."""
+        with connect(self.path) as conn:
+            row = conn.execute('SELECT data FROM jobs WHERE id = ?', (job_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save(self, job: dict):
+        """Insert or update a job."""
+        with connect(self.path) as conn:
+            conn.execute(
+                'INSERT INTO jobs (id, status, created, data) VALUES (?, ?, ?, ?)'
+                ' ON CONFLICT(id) DO UPDATE SET status = excluded.status, data = excluded.data',
+                (job['id'], job['status'], time.time(), json.dumps(job)),
+            )
+
+    def count(self) -> int:
+        """Number of known jobs."""
+        with connect(self.path) as conn:
+            return conn.execute('SELECT COUNT(*) FROM jobs').fetchone()[0]
+
+    def active_ids(self) -> set:
+        """Ids of jobs still pending or processing."""
+        with connect(self.path) as conn:
+            rows = conn.execute(
+                "SELECT id FROM jobs WHERE status IN ('pending', 'processing')"
+            ).fetchall()
+        return {row[0] for row in rows}
+
+    def heartbeat(self, job_id: str):
+        """Renew the lease of a job being processed."""
+        with connect(self.path) as conn:
+            conn.execute('UPDATE jobs SET heartbeat = ? WHERE id = ?', (time.time(), job_id))
+
+    def claim_pending(self, lease: float):
+        """
+        Mark the oldest pending job, or a processing job whose lease expired,
+        as processing and return it (None if none).
+        """
+        now = time.time()
+        with connect(self.path) as conn:
+            # BEGIN IMMEDIATE takes the write lock, so two workers never claim the same job
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                row = conn.execute(
+                    "SELECT data FROM jobs WHERE status = 'pending'"
+                    " OR (status = 'processing' AND heartbeat < ?) ORDER BY created LIMIT 1",
+                    (now - lease,),
+                ).fetchone()
+                job = None
+                if row:
+                    job = json.loads(row[0])
+                    job['status'] = 'processing'
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, data = ?, heartbeat = ? WHERE id = ?',
+                        (job['status'], json.dumps(job), now, job['id']),
+                    )
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return job
+
+    def fail_stale(self, lease: float, error: str) -> list:
+        """Mark processing jobs whose lease expired as failed, and return them."""
+        failed = []
+        with connect(self.path) as conn:
+            conn.execute('BEGIN IMMEDIATE')
+            try:
+                rows = conn.execute(
+                    "SELECT data FROM jobs WHERE status = 'processing' AND heartbeat < ?",
+                    (time.time() - lease,),
+                ).fetchall()
+                for row in rows:
+                    job = json.loads(row[0])
+                    job.update(status='error', step='error', error=error)
+                    conn.execute(
+                        'UPDATE jobs SET status = ?, data = ? WHERE id = ?',
+                        (job['status'], json.dumps(job), job['id']),
+                    )
+                    failed.append(job)
+                conn.execute('COMMIT')
+            except Exception:
+                conn.execute('ROLLBACK')
+                raise
+        return failed
+
+    def get_realtime(self, client_id: str):
+        """Return the stored real-time session state for a client, or None."""
+        with connect(self.path) as conn:
+            row = conn.execute('SELECT data FROM realtime WHERE client_id = ?', (client_id,)).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def save_realtime(self, client_id: str, state: dict):
+        """Store the real-time session state for a client."""
+        with connect(self.path) as conn:
+            conn.execute(
+                'INSERT OR REPLACE INTO realtime (client_id, data, updated) VALUES (?, ?, ?)',
+                (client_id, json.dumps(state), time.time()),
+            )
+
+    def prune_realtime(self, max_age: float) -> int:
+        """Forget real-time sessions not updated for `max_age` seconds; return how many."""
+        with connect(self.path) as conn:
+            cursor = conn.execute('DELETE FROM realtime WHERE updated < ?', (time.time() - max_age,))
+        return cursor.rowcount
+
+
+@contextmanager
+def keep_alive(jobs, job_id: str, interval: float, on_beat=None):
+    """
+    Renew a job's lease every `interval` seconds while the block runs.
+
+    Beats come from a real thread, so they continue while basic-pitch or
+    LilyPond block the eventlet hub. `on_beat` is also called on every beat
+    (e.g. to keep the job's artifacts marked as in use).
+    """
+    def beat_once():
+        jobs.heartbeat(job_id)
+        if on_beat:
+            on_beat()
+
+    beat_once()
+    stop = _threading.Event()
+
+    def beat():
+        while not stop.wait(interval):
+            beat_once()
+
+    thread = _threading.Thread(target=beat, daemon=True)
+    thread.start()
+    try:
+        yield
+    finally:
+        stop.set()
+        thread.join()
+
+
+def create_job_store(path: str = None):
+    """
+    Build the job store for the given configuration.
+
+    Args:
+        path: SQLite file path, or None for an in-memory store.
+    """
+    if path:
+        return SQLiteJobStore(path)
+    return MemoryJobStore()
@@ -0,0 +1,95 @@
+"""
+Socket.IO message queue for multi-process deployments.
+Redis through python-socketio, or an SQLite outbox polled by every
+process as a local stand-in when Redis is not available.
+"""
+import json
+import time
+
+import socketio
+
+from services.db import connect, init_db
+
+# Channel used by Flask-SocketIO for its own message queues
+CHANNEL = 'flask-socketio'
+
+# Outbox polling period and retention, in seconds
+SQLITE_POLL_INTERVAL = 0.05
+SQLITE_RETENTION = 60
+
+
+class SQLiteManager(socketio.PubSubManager):
+    """
+    Client manager that shares Socket.IO events through an SQLite outbox.
+
+    Every published message is appended to a table; every listening process
+    polls for rows newer than the last one it has seen. Rows older than
+    SQLITE_RETENTION are pruned by publishers. Only suited to processes on
+    the same host.
+    """
+    name = 'sqlite'
+
+    def __init__(self, url: str, channel: str = CHANNEL, write_only: bool = False, logger=None, json=None):
+        """
+        Args:
+            url: 'sqlite:///<path>' URL of the outbox file.
+            channel: Channel name, so several apps can share one file.
+            write_only: Only publish (external processes such as workers).
+        """
+        super().__init__(channel=channel, write_only=write_only, logger=logger, json=json)
+        self.path = url[len('sqlite:///'):]
+        self._last_prune = 0
+        init_db(self.path, [
+            'CREATE TABLE IF NOT EXISTS messages ('
+            ' id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL,'
+            ' created REAL NOT NULL, data TEXT NOT NULL)',
+        ])
+
+    def _publish(self, data):
+        now = time.time()
+        with connect(self.path) as conn:
+            # Messages are short-lived: skip the fsync on every commit (WAL stays consistent)
+            conn.execute('PRAGMA synchronous=NORMAL')
+            conn.execute(
+                'INSERT INTO messages (channel, created, data) VALUES (?, ?, ?)',
+                (self.channel, now, self.json.dumps(data)),
+            )
+            if now - self._last_prune > SQLITE_RETENTION:
+                conn.execute('DELETE FROM messages WHERE created < ?', (now - SQLITE_RETENTION,))
+                self._last_prune = now
+
+    def _listen(self):
+        # Only deliver messages published after this process started listening
+        with connect(self.path) as conn:
+            last_id = conn.execute('SELECT COALESCE(MAX(id), 0) FROM messages').fetchone()[0]
+        while True:
+            with connect(self.path) as conn:
+                rows = conn.execute(
+                    'SELECT id, data FROM messages WHERE id > ? AND channel = ? ORDER BY id',
+                    (last_id, self.channel),
+                ).fetchall()
+            for message_id, data in rows:
+                last_id = message_id
+                yield data
+            self.server.sleep(SQLITE_POLL_INTERVAL)
+
+
+def create_client_manager(url: str, write_only: bool = False, json=None):
+    """
+    Build the Socket.IO client manager for a message queue URL.
+
+    Args:
+        url: 'redis://…' / 'rediss://…', or 'sqlite:///<path>' for the local stand-in.
+        write_only: Only publish (external processes such as workers).
+        json: JSON module with dumps/loads used to encode messages.
+
+    Raises:
+        ValueError: for any other URL scheme.
+    """
+    if url.startswith(('redis://', 'rediss://')):
+        return socketio.RedisManager(url, channel=CHANNEL, write_only=write_only, json=json)
+    if url.startswith('sqlite:///'):
+        return SQLiteManager(url, write_only=write_only, json=json)
+    raise ValueError(
+        f"Unsupported message queue '{url}': use redis://… or sqlite:///<path>"
+    )
@@ -0,0 +1,111 @@
+"""
+Note transport service.
+Encodes note events for the REST API: time-window paging, a compact
+columnar binary format, optional compression and ETags.
+"""
+import bisect
+import gzip
+import hashlib
+import json
+import struct
+
+import numpy as np
+
+try:
+    import brotli
+except ImportError:  # brotli is optional, gzip is always available
+    brotli = None
+
+# Compact columnar format:
+#   header  : magic (4s) | version (B) | reserved (3x) | count (I) | duration (f)
+#   columns : start float32[count] | end float32[count]
+#             pitch uint8[count]   | velocity uint8[count]
+# All values little-endian.
+NOTES_BINARY_MIMETYPE = 'application/vnd.partition.notes'
+NOTES_BINARY_MAGIC = b'PGN1'
+NOTES_BINARY_VERSION = 1
+_HEADER = struct.Struct('<4sB3xIf')
+
+# Payloads smaller than this are not worth compressing
+MIN_COMPRESS_SIZE = 1024
+
+
+def slice_notes(note_events: list, start: float = None, end: float = None) -> list:
+    """
+    Return the notes whose onset falls in [start, end).
+
+    Args:
+        note_events: Note dicts sorted by 'start'.
+        start: Window start in seconds (None = beginning).
+        end: Window end in seconds (None = end of track).
+
+    Returns:
+        The notes in the window, still sorted by 'start'.
+    """
+    if start is None and end is None:
+        return note_events
+
+    key = lambda note: note['start']
+    lo = bisect.bisect_left(note_events, start, key=key) if start is not None else 0
+    hi = bisect.bisect_left(note_events, end, key=key) if end is not None else len(note_events)
+    return note_events[lo:hi]
+
+
+def encode_notes_json(payload: dict) -> bytes:
+    """Serialize a notes payload as compact UTF-8 JSON."""
+    return json.dumps(payload, separators=(',', ':'), ensure_ascii=False).encode('utf-8')
+
+
+def encode_notes_binary(note_events: list, duration: float) -> bytes:
+    """
+    Serialize note events into the compact columnar binary format.
+
+    Args:
+        note_events: List of note dicts with 'start', 'end', 'pitch', 'velocity'.
+        duration: Total audio duration in seconds.
+
+    Returns:
+        The encoded bytes (see NOTES_BINARY_MIMETYPE layout above).
+    """
+    count = len(note_events)
+    starts = np.fromiter((n['start'] for n in note_events), dtype='<f4', count=count)
+    ends = np.fromiter((n['end'] for n in note_events), dtype='<f4', count=count)
+    pitches = np.fromiter((n['pitch'] for n in note_events), dtype=np.uint8, count=count)
+    velocities = np.fromiter((n.get('velocity', 0) for n in note_events), dtype=np.uint8, count=count)
+
+    header = _HEADER.pack(NOTES_BINARY_MAGIC, NOTES_BINARY_VERSION, count, float(duration or 0))
+    return b''.join([
+        header,
+        starts.tobytes(),
+        ends.tobytes(),
+        pitches.tobytes(),
+        velocities.tobytes(),
+    ])
+
+
+def compute_etag(body: bytes) -> str:
+    """Compute a strong ETag for an uncompressed payload."""
+    return hashlib.sha1(body).hexdigest()
+
+
+def choose_encoding(accept_encodings) -> str:
+    """
+    Pick the best content encoding supported by both sides.
+
+    Args:
+        accept_encodings: Werkzeug `request.accept_encodings`.
+
+    Returns:
+        'br', 'gzip' or 'identity'.
+    """
+    supported = ['br', 'gzip', 'identity'] if brotli is not None else ['gzip', 'identity']
+    return accept_encodings.best_match(supported, default='identity') or 'identity'
+
+
+def compress(body: bytes, encoding: str) -> bytes:
+    """Compress a payload with the given content encoding."""
+    if encoding == 'br':
+        return brotli.compress(body, quality=5)
+    if encoding == 'gzip':
+        return gzip.compress(body, compresslevel=6)
+    return body
@@ -0,0 +1,124 @@
+"""
+Transcription pipeline: YouTube → WAV → MIDI → LilyPond PDF.
+Runs inside a web process or in a separate worker (worker.py).
+"""
+import os
+import logging
+
+from services.youtube import extract_audio, compress_audio
+from services.transcriber import transcribe_audio, build_transcription
+from services.fingerprint import compute_fingerprint, shift_notes, QUERY_SHIFTS
+from services.sheet_music import generate_lilypond
+from services.storage import discard
+
+logger = logging.getLogger(__name__)
+
+
+def run_pipeline(job_id: str, jobs, emit_update, tmp_dir: str, output_dir: str, keep_audio: bool = True,
+                 fingerprints=None):
+    """
+    Run the full transcription pipeline for a job.
+
+    Args:
+        job_id: Job identifier.
+        jobs: Job store holding the job.
+        emit_update: Callable receiving the job dict after every state change.
+        tmp_dir: Root directory for intermediate files.
+        output_dir: Root directory for generated sheet music.
+        keep_audio: Keep a compressed playback copy of the audio once transcribed.
+        fingerprints: Optional FingerprintIndex; identical recordings reuse its notes.
+    """
+    job = jobs.get(job_id)
+    job_dir = os.path.join(tmp_dir, job_id)
+
+    def update(**fields):
+        job.update(fields)
+        jobs.save(job)
+        emit_update(job)
+
+    try:
+        # Step 1: Download audio
+        logger.info(f"[{job_id}] Downloading audio...")
+        update(status='processing', step='downloading', progress=10)
+
+        audio_result = extract_audio(job['url'], job_dir)
+        logger.info(f"[{job_id}] Downloaded: {audio_result['title']}")
+        update(
+            title=audio_result['title'],
+            audio_path=audio_result['audio_path'],
+            duration=audio_result['duration'],
+            progress=30,
+            step='downloaded',
+        )
+
+        # Step 2: Transcribe to MIDI
+        logger.info(f"[{job_id}] Transcribing audio...")
+        update(step='transcribing', progress=40)
+
+        fingerprint, match = None, None
+        if fingerprints is not None:
+            try:
+                fingerprint = compute_fingerprint(audio_result['audio_path'], query_shifts=QUERY_SHIFTS)
+                match = fingerprints.match(fingerprint)
+            except Exception as e:
+                logger.warning(f"[{job_id}] Fingerprinting failed: {str(e)}")
+
+        if match:
+            logger.info(
+                f"[{job_id}] Same recording as {match['source']} "
+                f"(offset {match['offset']:.2f}s), reusing its transcription."
+            )
+            transcription = build_transcription(
+                shift_notes(match['raw_notes'], match['offset'], fingerprint['duration']),
+                job['instrument'],
+                job_dir,
+                os.path.splitext(os.path.basename(audio_result['audio_path']))[0],
+            )
+        else:
+            transcription = transcribe_audio(
+                audio_result['audio_path'],
+                job['instrument'],
+                job_dir,
+            )
+            if fingerprint is not None:
+                try:
+                    fingerprints.add(fingerprint, transcription['raw_notes'], source=audio_result['video_id'])
+                except Exception as e:
+                    logger.warning(f"[{job_id}] Could not index fingerprint: {str(e)}")
+        logger.info(f"[{job_id}] Transcribed {len(transcription['note_events'])} notes.")
+        update(
+            note_events=transcription['note_events'],
+            midi_path=transcription['midi_path'],
+            progress=70,
+            step='transcribed',
+        )
+        # The WAV has been consumed by inference: keep only a compressed copy for playback
+        playback_path = None
+        if keep_audio:
+            try:
+                playback_path = compress_audio(audio_result['audio_path'])
+            except Exception as e:
+                logger.warning(f"[{job_id}] Keeping WAV for playback: {str(e)}")
+        if not keep_audio or playback_path:
+            discard(audio_result['audio_path'])
+            update(audio_path=playback_path)
+
+        # Step 3: Generate sheet music
+        logger.info(f"[{job_id}] Generating sheet music...")
+        update(step='generating', progress=80)
+
+        sheet = generate_lilypond(
+            transcription['midi_path'],
+            job['instrument'],
+            os.path.join(output_dir, job_id),
+            title=job['title'],
+        )
+        # Consumed by LilyPond; kept for debugging when no PDF came out
+        if os.path.exists(sheet['pdf_path']):
+            discard(sheet['ly_path'])
+        logger.info(f"[{job_id}] Pipeline complete.")
+        update(pdf_path=sheet['pdf_path'], progress=100, step='complete', status='complete')
+
+    except Exception as e:
+        logger.error(f"[{job_id}] Error in pipeline: {str(e)}")
+        update(status='error', step='error', error=str(e))
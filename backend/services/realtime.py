@@ -8,12 +8,14 @@ import time
 class RealtimeSession:
     """Manages a real-time listening session."""
 
-    def __init__(self, note_events: list, audio_duration: float):
+    def __init__(self, note_events: list, audio_duration: float, job_id: str = None):
         """
         Args:
             note_events: List of note dicts with 'start', 'end', 'pitch', 'name'.
             audio_duration: Total audio duration in seconds.
+            job_id: Job the notes belong to, kept so the session can be restored.
         """
+        self.job_id = job_id
         self.note_events = sorted(note_events, key=lambda n: n['start'])
         self.audio_duration = audio_duration
         self.current_index = 0
@@ -72,6 +74,26 @@ class RealtimeSession:
                 break
         return upcoming
 
+    def to_dict(self) -> dict:
+        """Serialize the playback clock so the session can be restored by another process."""
+        return {
+            'job_id': self.job_id,
+            'current_index': self.current_index,
+            'is_playing': self.is_playing,
+            'start_time': self.start_time,
+            'pause_offset': self.pause_offset,
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict, note_events: list, audio_duration: float) -> 'RealtimeSession':
+        """Restore a session saved with to_dict()."""
+        session = cls(note_events, audio_duration, job_id=data.get('job_id'))
+        session.current_index = data.get('current_index', 0)
+        session.is_playing = data.get('is_playing', False)
+        session.start_time = data.get('start_time', 0)
+        session.pause_offset = data.get('pause_offset', 0)
+        return session
+
     def to_state(self) -> dict:
         """Serialize the session state for WebSocket."""
         pos = self.get_current_position()
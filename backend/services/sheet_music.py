@@ -3,6 +3,7 @@ Sheet music generation service: MIDI → LilyPond → PDF.
 """
 import os
 import subprocess
+import xml.etree.ElementTree as ET
 import pretty_midi
 import math
 
@@ -37,6 +38,35 @@ INSTRUMENT_DISPLAY = {
 }
 
 
+# MusicXML (step, alter) per pitch class, sharps like PITCH_TO_LILY
+PITCH_TO_MUSICXML = {
+    0: ('C', 0), 1: ('C', 1), 2: ('D', 0), 3: ('D', 1), 4: ('E', 0), 5: ('F', 0),
+    6: ('F', 1), 7: ('G', 0), 8: ('G', 1), 9: ('A', 0), 10: ('A', 1), 11: ('B', 0),
+}
+
+# MusicXML clef (sign, line) per LilyPond clef
+MUSICXML_CLEF = {
+    'treble': ('G', 2),
+    'bass': ('F', 4),
+}
+
+# MusicXML divisions per quarter note (sixteenth-note grid)
+MUSICXML_DIVISIONS = 4
+MUSICXML_MEASURE = 4 * MUSICXML_DIVISIONS  # 4/4
+
+# Duration in divisions → (type, dotted)
+MUSICXML_TYPES = {
+    16: ('whole', False),
+    12: ('half', True),
+    8: ('half', False),
+    6: ('quarter', True),
+    4: ('quarter', False),
+    3: ('eighth', True),
+    2: ('eighth', False),
+    1: ('16th', False),
+}
+
+
 def midi_note_to_lily(pitch: int) -> str:
     """Convert a MIDI note number to LilyPond pitch notation."""
     note_name = PITCH_TO_LILY[pitch % 12]
@@ -96,20 +126,8 @@ def generate_lilypond(midi_path: str, instrument: str, output_dir: str, title: s
     os.makedirs(output_dir, exist_ok=True)
     instrument = instrument.lower()
 
-    midi_data = pretty_midi.PrettyMIDI(midi_path)
-
-    # Estimate tempo
-    tempo_changes = midi_data.get_tempo_changes()
-    if len(tempo_changes[1]) > 0:
-        tempo = int(round(tempo_changes[1][0]))
-    else:
-        tempo = 120
-
-    # Get notes from first instrument
-    if not midi_data.instruments or not midi_data.instruments[0].notes:
-        raise ValueError("No notes found in MIDI file")
-
-    notes = sorted(midi_data.instruments[0].notes, key=lambda n: n.start)
+    # Estimate tempo and get notes from first instrument
+    notes, tempo = _load_midi_notes(midi_path)
 
     # Convert notes to LilyPond notation
     lily_notes = []
@@ -170,7 +188,6 @@ def generate_lilypond(midi_path: str, instrument: str, output_dir: str, title: s
 {notes_block}
   }}
   \\layout {{ }}
-  \\midi {{ }}
 }}
 '''
 
@@ -203,3 +220,160 @@ def generate_lilypond(midi_path: str, instrument: str, output_dir: str, title: s
         'ly_path': ly_path,
         'pdf_path': pdf_path,
     }
+
+
+def _load_midi_notes(midi_path: str):
+    """Load the first instrument's notes and tempo from a MIDI file."""
+    midi_data = pretty_midi.PrettyMIDI(midi_path)
+
+    tempo_changes = midi_data.get_tempo_changes()
+    if len(tempo_changes[1]) > 0:
+        tempo = int(round(tempo_changes[1][0]))
+    else:
+        tempo = 120
+
+    if not midi_data.instruments or not midi_data.instruments[0].notes:
+        raise ValueError("No notes found in MIDI file")
+
+    notes = sorted(midi_data.instruments[0].notes, key=lambda n: n.start)
+    return notes, tempo
+
+
+def _split_musicxml_duration(duration: int) -> list:
+    """Split a duration in divisions into standard note lengths (e.g. 5 → 4 + 1, 10 → 8 + 2)."""
+    parts = []
+    for length in sorted(MUSICXML_TYPES, reverse=True):
+        while duration >= length:
+            parts.append(length)
+            duration -= length
+    return parts
+
+
+def _musicxml_note(measure, pitch, duration: int, tie_start: bool, tie_stop: bool):
+    """Append a <note> (or rest when pitch is None) to a MusicXML measure."""
+    note_el = ET.SubElement(measure, 'note')
+    if pitch is None:
+        ET.SubElement(note_el, 'rest')
+    else:
+        step, alter = PITCH_TO_MUSICXML[pitch % 12]
+        pitch_el = ET.SubElement(note_el, 'pitch')
+        ET.SubElement(pitch_el, 'step').text = step
+        if alter:
+            ET.SubElement(pitch_el, 'alter').text = str(alter)
+        ET.SubElement(pitch_el, 'octave').text = str((pitch // 12) - 1)
+    ET.SubElement(note_el, 'duration').text = str(duration)
+    if tie_stop:
+        ET.SubElement(note_el, 'tie', type='stop')
+    if tie_start:
+        ET.SubElement(note_el, 'tie', type='start')
+    if duration in MUSICXML_TYPES:
+        note_type, dotted = MUSICXML_TYPES[duration]
+        ET.SubElement(note_el, 'type').text = note_type
+        if dotted:
+            ET.SubElement(note_el, 'dot')
+    if tie_start or tie_stop:
+        notations = ET.SubElement(note_el, 'notations')
+        if tie_stop:
+            ET.SubElement(notations, 'tied', type='stop')
+        if tie_start:
+            ET.SubElement(notations, 'tied', type='start')
+
+
+def generate_musicxml(midi_path: str, instrument: str, output_dir: str, title: str = "Transcription") -> dict:
+    """
+    Generate a MusicXML file from a MIDI file.
+
+    Uses the same monophonic reading as generate_lilypond: notes are laid
+    out one after another on a sixteenth-note grid, with rests for gaps,
+    and tied across bar lines.
+
+    Args:
+        midi_path: Path to the MIDI file.
+        instrument: Instrument name.
+        output_dir: Directory to save output files.
+        title: Title for the sheet music.
+
+    Returns:
+        dict with keys: 'musicxml_path'
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    instrument = instrument.lower()
+
+    notes, tempo = _load_midi_notes(midi_path)
+    beats_per_second = tempo / 60.0
+
+    # Flatten to (pitch | None, duration in divisions)
+    events = []
+    for i, note in enumerate(notes):
+        if i > 0:
+            gap_beats = (note.start - notes[i - 1].end) * beats_per_second
+            if gap_beats >= 0.125:
+                events.append((None, max(1, int(round(gap_beats * MUSICXML_DIVISIONS)))))
+        duration_beats = (note.end - note.start) * beats_per_second
+        events.append((note.pitch, max(1, int(round(duration_beats * MUSICXML_DIVISIONS)))))
+
+    display_name = INSTRUMENT_DISPLAY.get(instrument, instrument.capitalize())
+    clef_sign, clef_line = MUSICXML_CLEF[INSTRUMENT_CLEF.get(instrument, 'treble')]
+
+    root = ET.Element('score-partwise', version='4.0')
+    work = ET.SubElement(root, 'work')
+    ET.SubElement(work, 'work-title').text = title
+    identification = ET.SubElement(root, 'identification')
+    encoding = ET.SubElement(identification, 'encoding')
+    ET.SubElement(encoding, 'software').text = 'Partition Generator'
+    part_list = ET.SubElement(root, 'part-list')
+    score_part = ET.SubElement(part_list, 'score-part', id='P1')
+    ET.SubElement(score_part, 'part-name').text = display_name
+    part = ET.SubElement(root, 'part', id='P1')
+
+    def new_measure(number: int):
+        measure = ET.SubElement(part, 'measure', number=str(number))
+        if number == 1:
+            attributes = ET.SubElement(measure, 'attributes')
+            ET.SubElement(attributes, 'divisions').text = str(MUSICXML_DIVISIONS)
+            time_el = ET.SubElement(attributes, 'time')
+            ET.SubElement(time_el, 'beats').text = '4'
+            ET.SubElement(time_el, 'beat-type').text = '4'
+            clef_el = ET.SubElement(attributes, 'clef')
+            ET.SubElement(clef_el, 'sign').text = clef_sign
+            ET.SubElement(clef_el, 'line').text = str(clef_line)
+            ET.SubElement(measure, 'sound', tempo=str(tempo))
+        return measure
+
+    measure_number = 1
+    measure = new_measure(measure_number)
+    filled = 0
+    for pitch, remaining in events:
+        tie_stop = False
+        while remaining > 0:
+            if filled == MUSICXML_MEASURE:
+                measure_number += 1
+                measure = new_measure(measure_number)
+                filled = 0
+            chunk = min(remaining, MUSICXML_MEASURE - filled)
+            remaining -= chunk
+            filled += chunk
+            tied = pitch is not None
+            lengths = _split_musicxml_duration(chunk)
+            for i, length in enumerate(lengths):
+                more = remaining > 0 or i < len(lengths) - 1
+                _musicxml_note(measure, pitch, length, tie_start=tied and more, tie_stop=tied and tie_stop)
+                tie_stop = True
+
+    # Pad the last measure with rests
+    for length in _split_musicxml_duration(MUSICXML_MEASURE - filled):
+        _musicxml_note(measure, None, length, tie_start=False, tie_stop=False)
+
+    basename = os.path.splitext(os.path.basename(midi_path))[0]
+    musicxml_path = os.path.join(output_dir, f"{basename}.musicxml")
+
+    ET.indent(root)
+    with open(musicxml_path, 'wb') as f:
+        f.write(b'<?xml version="1.0" encoding="UTF-8"?>\n')
+        f.write(b'<!DOCTYPE score-partwise PUBLIC "-//Recordare//DTD MusicXML 4.0 Partwise//EN" '
+                b'"http://www.musicxml.org/dtds/partwise.dtd">\n')
+        ET.ElementTree(root).write(f, encoding='utf-8', xml_declaration=False)
+
+    return {
+        'musicxml_path': musicxml_path,
+    }
@@ -0,0 +1,145 @@
+"""
+Disk lifecycle service.
+Tracks the per-job artifact directories under tmp/ and output/, evicts
+them by age and LRU under a disk quota, and removes intermediates early.
+"""
+import os
+import shutil
+import time
+import logging
+
+from services.db import db_size
+
+logger = logging.getLogger(__name__)
+
+
+def dir_size(path: str) -> int:
+    """Total size in bytes of the files under a directory."""
+    total = 0
+    for root, _, files in os.walk(path):
+        for name in files:
+            try:
+                total += os.path.getsize(os.path.join(root, name))
+            except OSError:
+                pass  # removed while walking
+    return total
+
+
+def touch_job(job_id: str, roots: list):
+    """Mark a job's artifacts as recently used (LRU clock is the directory mtime)."""
+    now = time.time()
+    for root in roots:
+        try:
+            os.utime(os.path.join(root, job_id), (now, now))
+        except OSError:
+            pass
+
+
+def discard(*paths):
+    """Delete intermediate files that are no longer needed, ignoring missing ones."""
+    for path in paths:
+        if path and os.path.exists(path):
+            os.remove(path)
+            logger.info(f"Removed intermediate {path}")
+
+
+class DiskJanitor:
+    """
+    Keeps job artifact directories within a disk quota.
+
+    Each job owns `<root>/<job_id>` under every root. A job directory is
+    evicted when it is older than `max_age`, then least recently used first
+    while total usage exceeds `quota`. Jobs reported by any of the `pinned`
+    callables (e.g. live jobs), and directories used within the last `grace`
+    seconds, are never evicted: other processes sharing the roots may run
+    jobs this process's store does not know about. Shared SQLite `files`
+    (e.g. the fingerprint index) count toward the quota but are never evicted.
+    """
+
+    def __init__(self, roots: list, quota: int, max_age: float, pinned: list = None, files: list = None,
+                 grace: float = 0):
+        """
+        Args:
+            roots: Artifact root directories (e.g. TMP_DIR, OUTPUT_DIR).
+            quota: Maximum total size in bytes (0 = unlimited).
+            max_age: Seconds since last use after which a job is evicted (0 = never).
+            pinned: Callables returning a set of job ids that must be kept.
+            files: SQLite file paths whose size is counted but never evicted.
+            grace: Seconds since last use during which a job is never evicted.
+        """
+        self.roots = roots
+        self.quota = quota
+        self.max_age = max_age
+        self.pinned = list(pinned or [])
+        self.files = list(files or [])
+        self.grace = grace
+        self.last_report = None
+
+    def scan(self) -> dict:
+        """Return {job_id: {'size', 'last_used', 'paths'}} for every job directory."""
+        entries = {}
+        for root in self.roots:
+            if not os.path.isdir(root):
+                continue
+            with os.scandir(root) as it:
+                for entry in it:
+                    if not entry.is_dir(follow_symlinks=False):
+                        continue
+                    info = entries.setdefault(entry.name, {'size': 0, 'last_used': 0, 'paths': []})
+                    info['size'] += dir_size(entry.path)
+                    info['last_used'] = max(info['last_used'], entry.stat().st_mtime)
+                    info['paths'].append(entry.path)
+        return entries
+
+    def sweep(self) -> dict:
+        """Evict expired and least recently used job directories, and return a usage report."""
+        entries = self.scan()
+        pinned = set()
+        for provider in self.pinned:
+            pinned |= set(provider())
+
+        now = time.time()
+        evicted = []
+
+        # Recently used directories may belong to a job running in another process
+        pinned |= {j for j, info in entries.items() if now - info['last_used'] < self.grace}
+
+        def evict(job_id):
+            for path in entries[job_id]['paths']:
+                shutil.rmtree(path, ignore_errors=True)
+            evicted.append(job_id)
+            del entries[job_id]
+
+        # Age-based eviction
+        if self.max_age:
+            for job_id in [j for j, info in entries.items()
+                           if j not in pinned and now - info['last_used'] > self.max_age]:
+                evict(job_id)
+
+        # LRU eviction down to the quota
+        index_bytes = sum(db_size(path) for path in self.files)
+        used = index_bytes + sum(info['size'] for info in entries.values())
+        if self.quota and used > self.quota:
+            candidates = sorted(
+                (j for j in entries if j not in pinned),
+                key=lambda j: entries[j]['last_used'],
+            )
+            for job_id in candidates:
+                if used <= self.quota:
+                    break
+                used -= entries[job_id]['size']
+                evict(job_id)
+
+        if evicted:
+            logger.info(f"Janitor evicted {len(evicted)} job(s): {', '.join(evicted)}")
+
+        self.last_report = {
+            'used_bytes': used,
+            'quota_bytes': self.quota,
+            'index_bytes': index_bytes,
+            'job_dirs': len(entries),
+            'pinned_jobs': len(pinned & set(entries)),
+            'evicted_last_sweep': len(evicted),
+            'last_sweep': round(now, 3),
+        }
+        return self.last_report
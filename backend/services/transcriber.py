@@ -32,24 +32,44 @@ INSTRUMENT_RANGES = {
 }
 
 
-def transcribe_audio(audio_path: str, instrument: str, output_dir: str) -> dict:
+def detect_notes(audio_path: str) -> list:
     """
-    Transcribe an audio file to MIDI using basic-pitch.
+    Run basic-pitch inference on an audio file.
+
+    The result does not depend on the instrument, so it can be cached and
+    reused for any instrument through build_transcription().
 
     Args:
         audio_path: Path to the WAV audio file.
+
+    Returns:
+        List of raw notes as [start, end, pitch, velocity].
+    """
+    model_output, midi_data, note_events = predict(audio_path)
+
+    raw_notes = []
+    for midi_instrument in midi_data.instruments:
+        for note in midi_instrument.notes:
+            raw_notes.append([float(note.start), float(note.end), int(note.pitch), int(note.velocity)])
+    return raw_notes
+
+
+def build_transcription(raw_notes: list, instrument: str, output_dir: str, basename: str) -> dict:
+    """
+    Filter raw notes for an instrument, write the MIDI file and build note events.
+
+    Args:
+        raw_notes: Notes from detect_notes(), as [start, end, pitch, velocity].
         instrument: Instrument name (e.g. 'piano', 'guitare').
         output_dir: Directory to save the MIDI file.
+        basename: Base name of the MIDI file.
 
     Returns:
-        dict with keys: 'midi_path', 'note_events'
+        dict with keys: 'midi_path', 'note_events', 'note_count'
     """
     os.makedirs(output_dir, exist_ok=True)
     instrument = instrument.lower()
 
-    # Run basic-pitch inference
-    model_output, midi_data, note_events = predict(audio_path)
-
     # Filter notes by instrument range
     pitch_range = INSTRUMENT_RANGES.get(instrument, (0, 127))
     filtered_midi = pretty_midi.PrettyMIDI()
@@ -57,22 +77,20 @@ def transcribe_audio(audio_path: str, instrument: str, output_dir: str) -> dict:
     program = INSTRUMENT_PROGRAMS.get(instrument, 0)
     inst = pretty_midi.Instrument(program=program, name=instrument.capitalize())
 
-    for midi_instrument in midi_data.instruments:
-        for note in midi_instrument.notes:
-            if pitch_range[0] <= note.pitch <= pitch_range[1]:
-                inst.notes.append(
-                    pretty_midi.Note(
-                        velocity=note.velocity,
-                        pitch=note.pitch,
-                        start=note.start,
-                        end=note.end,
-                    )
+    for start, end, pitch, velocity in raw_notes:
+        if pitch_range[0] <= pitch <= pitch_range[1]:
+            inst.notes.append(
+                pretty_midi.Note(
+                    velocity=velocity,
+                    pitch=pitch,
+                    start=start,
+                    end=end,
                 )
+            )
 
     filtered_midi.instruments.append(inst)
 
     # Save MIDI
-    basename = os.path.splitext(os.path.basename(audio_path))[0]
     midi_path = os.path.join(output_dir, f"{basename}_{instrument}.mid")
     filtered_midi.write(midi_path)
 
@@ -94,3 +112,22 @@ def transcribe_audio(audio_path: str, instrument: str, output_dir: str) -> dict:
         'note_events': note_events_list,
         'note_count': len(note_events_list),
     }
+
+
+def transcribe_audio(audio_path: str, instrument: str, output_dir: str) -> dict:
+    """
+    Transcribe an audio file to MIDI using basic-pitch.
+
+    Args:
+        audio_path: Path to the WAV audio file.
+        instrument: Instrument name (e.g. 'piano', 'guitare').
+        output_dir: Directory to save the MIDI file.
+
+    Returns:
+        dict with keys: 'midi_path', 'note_events', 'note_count', 'raw_notes'
+    """
+    raw_notes = detect_notes(audio_path)
+    basename = os.path.splitext(os.path.basename(audio_path))[0]
+    result = build_transcription(raw_notes, instrument, output_dir, basename)
+    result['raw_notes'] = raw_notes
+    return result
@@ -2,8 +2,15 @@
 YouTube audio extraction service using yt-dlp.
 """
 import os
+import subprocess
 import yt_dlp
 
+FFMPEG_LOCATION = '/opt/homebrew/bin'
+
+# Playback copy served by /api/audio once the WAV has been transcribed
+PLAYBACK_EXTENSION = 'm4a'
+PLAYBACK_BITRATE = '128k'
+
 
 def extract_audio(youtube_url: str, output_dir: str) -> dict:
     """
@@ -29,7 +36,7 @@ def extract_audio(youtube_url: str, output_dir: str) -> dict:
         'noplaylist': True,
         'quiet': True,
         'no_warnings': True,
-        'ffmpeg_location': '/opt/homebrew/bin',
+        'ffmpeg_location': FFMPEG_LOCATION,
     }
 
     with yt_dlp.YoutubeDL(ydl_opts) as ydl:
@@ -46,3 +53,36 @@ def extract_audio(youtube_url: str, output_dir: str) -> dict:
         'duration': duration,
         'video_id': video_id,
     }
+
+
+def compress_audio(wav_path: str) -> str:
+    """
+    Re-encode an extracted WAV to AAC for playback, next to the original.
+
+    Args:
+        wav_path: Path to the WAV file.
+
+    Returns:
+        Path to the compressed file.
+    """
+    ffmpeg = os.path.join(FFMPEG_LOCATION, 'ffmpeg')
+    if not os.path.exists(ffmpeg):
+        ffmpeg = 'ffmpeg'
+    output_path = f"{os.path.splitext(wav_path)[0]}.{PLAYBACK_EXTENSION}"
+
+    try:
+        result = subprocess.run(
+            [ffmpeg, '-y', '-loglevel', 'error', '-i', wav_path,
+             '-vn', '-c:a', 'aac', '-b:a', PLAYBACK_BITRATE, output_path],
+            capture_output=True,
+            text=True,
+            timeout=300,
+        )
+    except FileNotFoundError:
+        raise RuntimeError("FFmpeg is not installed. Install it with: brew install ffmpeg")
+    except subprocess.TimeoutExpired:
+        raise RuntimeError("Audio compression timed out.")
+    if result.returncode != 0:
+        raise RuntimeError(f"Audio compression failed: {result.stderr.strip()}")
+
+    return output_path
@@ -0,0 +1,64 @@
+"""
+Pipeline worker for scaled-out deployments.
+
+Claims pending jobs from the shared job store and runs the transcription
+pipeline, publishing `job_update` events through the Socket.IO message
+queue so whichever web process holds the client's socket delivers them.
+
+    PARTITION_JOB_STORE=/var/lib/partition/jobs.db \\
+    PARTITION_MESSAGE_QUEUE=redis://localhost:6379/0 \\
+    python worker.py
+"""
+import eventlet
+eventlet.monkey_patch()
+
+import json
+import logging
+from flask_socketio import SocketIO
+
+from config import (
+    TMP_DIR, OUTPUT_DIR, MESSAGE_QUEUE, JOB_STORE, WORKER_POLL_INTERVAL, KEEP_AUDIO,
+    FINGERPRINT_INDEX, FINGERPRINT_MAX_RECORDINGS, JOB_LEASE, JOB_HEARTBEAT_INTERVAL,
+)
+from services.pipeline import run_pipeline
+from services.job_store import create_job_store, keep_alive
+from services.message_queue import create_client_manager
+from services.fingerprint import FingerprintIndex
+from services.storage import touch_job
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+
+def main():
+    if not JOB_STORE or not MESSAGE_QUEUE:
+        raise SystemExit("worker.py needs PARTITION_JOB_STORE and PARTITION_MESSAGE_QUEUE to be set")
+
+    # Write-only Socket.IO client of the message queue
+    socketio = SocketIO(
+        message_queue=MESSAGE_QUEUE,
+        client_manager=create_client_manager(MESSAGE_QUEUE, write_only=True, json=json),
+    )
+    jobs = create_job_store(JOB_STORE)
+    fingerprints = (FingerprintIndex(FINGERPRINT_INDEX, max_recordings=FINGERPRINT_MAX_RECORDINGS)
+                    if FINGERPRINT_INDEX else None)
+
+    def emit_job_update(job: dict):
+        socketio.emit('job_update', job, to=job['id'])
+
+    logger.info("Worker started, waiting for jobs...")
+    while True:
+        # Pending jobs, or jobs whose worker died mid-pipeline
+        job = jobs.claim_pending(JOB_LEASE)
+        if job is None:
+            eventlet.sleep(WORKER_POLL_INTERVAL)
+            continue
+        logger.info(f"Claimed job {job['id']}")
+        with keep_alive(jobs, job['id'], JOB_HEARTBEAT_INTERVAL,
+                        on_beat=lambda: touch_job(job['id'], [TMP_DIR, OUTPUT_DIR])):
+            run_pipeline(job['id'], jobs, emit_job_update, TMP_DIR, OUTPUT_DIR,
+                         keep_audio=KEEP_AUDIO, fingerprints=fingerprints)
+
+
+if __name__ == '__main__':
+    main()
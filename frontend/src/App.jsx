@@ -8,7 +8,13 @@ import RealtimeListener from './components/RealtimeListener'
 import { io } from 'socket.io-client'
 
 const API_URL = 'http://localhost:5001/api'
-const socket = io('http://localhost:5001', { autoConnect: false })
+const CLIENT_TOKEN_KEY = 'partition_client_token'
+
+// Signed per-tab id issued by the backend, so a reconnect to any instance restores our session
+const socket = io('http://localhost:5001', {
+  autoConnect: false,
+  auth: (cb) => cb({ client_token: sessionStorage.getItem(CLIENT_TOKEN_KEY) }),
+})
 
 function App() {
   const [step, setStep] = useState('input') // input | processing | result
@@ -34,20 +40,36 @@ function App() {
     }
 
     const onConnect = () => console.log('Socket connected')
+    const onClientToken = (data) => sessionStorage.setItem(CLIENT_TOKEN_KEY, data.token)
     const onDisconnect = () => console.log('Socket disconnected')
 
     socket.on('job_update', onJobUpdate)
+    socket.on('client_token', onClientToken)
     socket.on('connect', onConnect)
     socket.on('disconnect', onDisconnect)
 
     return () => {
       socket.off('job_update', onJobUpdate)
+      socket.off('client_token', onClientToken)
       socket.off('connect', onConnect)
       socket.off('disconnect', onDisconnect)
       socket.disconnect()
     }
   }, []) // Remove jobId dependency to maintain connection
 
+  // Subscribe to the job's updates, again after every reconnect
+  useEffect(() => {
+    if (!jobId) return
+
+    const subscribe = () => socket.emit('job_subscribe', { job_id: jobId })
+    if (socket.connected) subscribe()
+    socket.on('connect', subscribe)
+
+    return () => {
+      socket.off('connect', subscribe)
+    }
+  }, [jobId])
+
   const handleGenerate = useCallback(async () => {
     setError(null)
     setStep('processing')
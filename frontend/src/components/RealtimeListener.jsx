@@ -2,6 +2,7 @@ import { useState, useEffect, useRef } from 'react'
 import './RealtimeListener.css'
 
 const API_URL = 'http://localhost:5001/api'
+const NOTES_WINDOW = 30 // seconds of notes per request
 
 function RealtimeListener({ jobId, socket }) {
     const [notes, setNotes] = useState([])
@@ -14,15 +15,29 @@ function RealtimeListener({ jobId, socket }) {
     const animFrameRef = useRef(null)
     const notesContainerRef = useRef(null)
 
-    // Fetch notes on mount
+    // Fetch notes on mount, one time window at a time
     useEffect(() => {
-        fetch(`${API_URL}/notes/${jobId}`)
-            .then((res) => res.json())
-            .then((data) => {
-                setNotes(data.notes || [])
-                setDuration(data.duration || 0)
-            })
-            .catch(console.error)
+        let cancelled = false
+        setNotes([])
+
+        const fetchWindow = (start) => {
+            fetch(`${API_URL}/notes/${jobId}?start=${start}&end=${start + NOTES_WINDOW}`)
+                .then((res) => res.json())
+                .then((data) => {
+                    if (cancelled) return
+                    setNotes((prev) => prev.concat(data.notes || []))
+                    setDuration(data.duration || 0)
+                    if (data.next_start != null) {
+                        fetchWindow(data.next_start)
+                    }
+                })
+                .catch(console.error)
+        }
+
+        fetchWindow(0)
+        return () => {
+            cancelled = true
+        }
     }, [jobId])
 
     // Animation loop for syncing notes
@@ -21,6 +21,13 @@ function SheetViewer({ jobId, title }) {
         link.click()
     }
 
+    const handleExport = (format, extension) => {
+        const link = document.createElement('a')
+        link.href = `${API_URL}/export/${jobId}/${format}`
+        link.download = `partition_${jobId}.${extension}`
+        link.click()
+    }
+
     return (
         <div className="sheet-viewer glass-card">
             <div className="sheet-header">
@@ -35,6 +42,12 @@ function SheetViewer({ jobId, title }) {
                     <button className="btn btn-primary btn-sm" onClick={handleDownload}>
                         ⬇️ Télécharger PDF
                     </button>
+                    <button className="btn btn-secondary btn-sm" onClick={() => handleExport('midi', 'mid')}>
+                        MIDI
+                    </button>
+                    <button className="btn btn-secondary btn-sm" onClick={() => handleExport('musicxml', 'musicxml')}>
+                        MusicXML
+                    </button>
                 </div>
             </div>
 